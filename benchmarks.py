@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+BSV Wallet - Benchmarks
+Usage: python benchmarks.py [name ...]   (no name runs all)
+- coins: coin selection over synthetic UTXO sets
+- signing: serial vs process-pool input signing
+- sighash: cached-midstate preimages vs per-input recomputation
+- crypto: sign/verify rates per installed secp256k1 backend
+"""
+
+import os
+import random
+import sys
+import time
+
+from bsv_wallet import (CRYPTO_BACKENDS, Chain, Colors, CoinSelector, Key, ParallelSigner, SighashEngine,
+                        Transaction, TxOutput, Unspent, Utxo)
+
+# ==========================================================
+# HELPERS
+# ==========================================================
+
+def synthetic_utxos(count, seed=42):
+    """Log-uniform values from dust to 1 BSV, heights spread over ~2 years of blocks"""
+    rng = random.Random(seed)
+    return [Utxo(f"{i:064x}", rng.randrange(4), int(10 ** rng.uniform(2.5, 8)), rng.randrange(0, 100_000))
+            for i in range(count)]
+
+def synthetic_tx(inputs, key):
+    """Unsigned one-output sweep of `inputs` P2PKH UTXOs owned by `key`"""
+    tx = Transaction(chain=Chain.MAIN)
+    tx.add_inputs([Unspent(txid=f"{i:064x}", vout=0, satoshi=1000, private_keys=[key]) for i in range(inputs)])
+    tx.add_output(TxOutput(key.address(), inputs * 1000 - inputs * 100))
+    return tx
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+# ==========================================================
+# COIN SELECTION
+# ==========================================================
+
+def bench_coin_selection(sizes=(10_000, 100_000, 1_000_000), rounds=200):
+    rng = random.Random(7)
+    targets = [int(10 ** rng.uniform(4, 7)) for _ in range(rounds)]
+    print(f"{'UTXOs':>10} {'build':>9} {'strategy':>14} {'avg select':>11} {'avg inputs':>11}")
+    for size in sizes:
+        utxos = synthetic_utxos(size)
+        selector, build_time = timed(CoinSelector, utxos)
+        for strategy in selector.strategies:
+            inputs = 0
+            started = time.perf_counter()
+            for target in targets:
+                inputs += len(selector.select(target, strategy=strategy).utxos)
+            avg = (time.perf_counter() - started) / rounds
+            print(f"{size:>10,} {build_time:>8.2f}s {strategy:>14} {avg * 1e6:>9.0f}us {inputs / rounds:>11.1f}")
+
+# ==========================================================
+# SIGNING
+# ==========================================================
+
+def bench_signing(sizes=(100, 1_000, 5_000), workers=(1, 2, 4, 8)):
+    key = Key()
+    workers = sorted({w for w in workers if w <= max(os.cpu_count() or 1, 2)})
+    print(f"{'inputs':>8} {'workers':>8} {'time':>9} {'inputs/s':>10} {'identical':>10}")
+    for size in sizes:
+        serial, elapsed = timed(synthetic_tx(size, key).sign)
+        print(f"{size:>8,} {'serial':>8} {elapsed:>8.2f}s {size / elapsed:>10,.0f} {'-':>10}")
+        for count in workers:
+            signer = ParallelSigner(workers=count, min_inputs=1)
+            signer.sign(synthetic_tx(8, key))  # start the pool outside the timing
+            signed, elapsed = timed(signer.sign, synthetic_tx(size, key))
+            signer.close()
+            same = "yes" if signed.serialize() == serial.serialize() else "NO"
+            print(f"{size:>8,} {count:>8} {elapsed:>8.2f}s {size / elapsed:>10,.0f} {same:>10}")
+
+# ==========================================================
+# SIGHASH
+# ==========================================================
+
+def bench_sighash(sizes=(100, 500, 1_000, 2_000, 5_000, 10_000), naive_limit=1_000):
+    """Per-input cost should stay flat for the engine; bsvlib's digest(i) grows with n"""
+    key = Key()
+    print(f"{'inputs':>8} {'engine':>9} {'per input':>10} {'digest(i)':>10} {'per input':>10}")
+    for size in sizes:
+        tx = synthetic_tx(size, key)
+        preimages, elapsed = timed(lambda: SighashEngine(tx).preimages())
+        row = f"{size:>8,} {elapsed * 1000:>7.1f}ms {elapsed / size * 1e6:>8.1f}us"
+        if size <= naive_limit:
+            naive, naive_elapsed = timed(lambda: [tx.digest(i) for i in range(size)])
+            assert naive == preimages
+            row += f" {naive_elapsed * 1000:>8.0f}ms {naive_elapsed / size * 1e6:>8.0f}us"
+        else:
+            row += f" {'skipped':>10} {'-':>10}"
+        print(row)
+
+# ==========================================================
+# CRYPTO
+# ==========================================================
+
+def bench_crypto(count=2_000):
+    key = Key()
+    secret, public_key = key.serialize(), key.public_key().serialize()
+    messages = [os.urandom(180) for _ in range(count)]
+    reference = None
+    print(f"{'backend':>10} {'sign/s':>10} {'verify/s':>10} {'identical':>10}")
+    for name, (backend, available) in CRYPTO_BACKENDS.items():
+        if not available():
+            print(f"{name:>10} {'not installed':>32}")
+            continue
+        crypto = backend()
+        signatures, sign_time = timed(lambda: [crypto.sign(secret, m) for m in messages])
+        valid, verify_time = timed(lambda: [crypto.verify(public_key, s, m) for s, m in zip(signatures, messages)])
+        assert all(valid)
+        reference = reference or signatures
+        same = "yes" if signatures == reference and signatures[0] == key.sign(messages[0]) else "NO"
+        print(f"{name:>10} {count / sign_time:>10,.0f} {count / verify_time:>10,.0f} {same:>10}")
+
+# ==========================================================
+# MAIN
+# ==========================================================
+
+BENCHMARKS = {
+    "coins": bench_coin_selection,
+    "signing": bench_signing,
+    "sighash": bench_sighash,
+    "crypto": bench_crypto,
+}
+
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            Colors.print(Colors.RED, f"Unknown benchmark: {name} (choose from {', '.join(BENCHMARKS)})")
+            sys.exit(1)
+        Colors.print(Colors.CYAN, f"\n=== {name} ===")
+        BENCHMARKS[name]()
+
+if __name__ == "__main__":
+    main()